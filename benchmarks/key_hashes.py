@@ -0,0 +1,35 @@
+"""Micro-benchmark of djutils.utils.key_hash and key_hashes
+
+python benchmarks/key_hashes.py [n]
+"""
+import sys
+import timeit
+import numpy as np
+from djutils.utils import key_hash, key_hashes
+
+
+def main(n=100000):
+    rows = np.zeros(n, dtype=[("animal_id", "<i8"), ("session", "<i2"), ("scan_idx", "<i2"), ("name", "U16")])
+    rows["animal_id"] = np.arange(n)
+    rows["session"] = np.arange(n) % 7
+    rows["scan_idx"] = np.arange(n) % 3
+    rows["name"] = "scan"
+    keys = [{k: v.item() for k, v in zip(rows.dtype.names, row)} for row in rows]
+
+    assert [key_hash(k) for k in keys] == key_hashes(keys) == key_hashes(rows)
+    assert key_hashes(keys, compatible=False) == key_hashes(rows, compatible=False)
+
+    cases = [
+        ("key_hash per key", lambda: [key_hash(k) for k in keys]),
+        ("key_hashes(dicts)", lambda: key_hashes(keys)),
+        ("key_hashes(array)", lambda: key_hashes(rows)),
+        ("key_hashes(dicts, compatible=False)", lambda: key_hashes(keys, compatible=False)),
+        ("key_hashes(array, compatible=False)", lambda: key_hashes(rows, compatible=False)),
+    ]
+    for name, func in cases:
+        t = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"{name:<40}{t:8.3f} s{n / t:14,.0f} keys/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
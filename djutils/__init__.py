@@ -1,8 +1,9 @@
 from datajoint import U
 from .functions import merge, unique
-from .rows import rowmethod, rowproperty
+from .rows import rowmethod, rowproperty, row_key, evaluate
 from .derived import keys, keymethod, keyproperty
-from .context import cache_rowproperty
+from .context import cache_rowproperty, cache_queries, profile_filters
+from .parallel import map
 from .serialize import pickle_save, pickle_load
 from .files import Filepath
 from .errors import MissingError, RestrictionError
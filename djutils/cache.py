@@ -1,41 +1,586 @@
+import os
+import re
+import sys
+import time
+import pickle
+import sqlite3
+import threading
+import numpy as np
+from copy import deepcopy
 from collections import OrderedDict
+from contextvars import ContextVar
+from functools import wraps
+from types import CodeType
 from datajoint import Table
 from .derived import Keys
 from .utils import key_hash
+from .serialize import pickle_save, pickle_load
+from .logging import logger
+
+
+def sizeof(obj):
+    """Estimated number of bytes of an object
+
+    Parameters
+    ----------
+    obj : object
+        object to measure -- numpy arrays are measured by nbytes, containers recursively
+
+    Returns
+    -------
+    int
+        estimated number of bytes
+    """
+    nbytes = getattr(obj, "nbytes", None)
+
+    if isinstance(nbytes, int):
+        return nbytes
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(x) for x in obj)
+    elif isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    else:
+        return sys.getsizeof(obj)
 
 
 class Cache(OrderedDict):
     """Cache"""
 
-    def __init__(self, maxsize=None):
+    def __init__(self, maxsize=None, maxbytes=None):
+        """
+        Parameters
+        ----------
+        maxsize : int | None
+            maximum number of cache elements
+        maxbytes : int | None
+            maximum estimated number of bytes of cache elements
+        """
         self.maxsize = float("inf") if maxsize is None else int(maxsize)
+        self.maxbytes = float("inf") if maxbytes is None else int(maxbytes)
+        self.sizes = dict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def __setitem__(self, key, value):
-        if len(self) >= self.maxsize:
+        size = sizeof(value)
+
+        if key in self:
+            del self[key]
+
+        if self.maxsize < 1 or size > self.maxbytes:
+            return
+
+        while self and (len(self) >= self.maxsize or self.bytes + size > self.maxbytes):
             self.popitem(last=False)
+            self.evictions += 1
 
         super().__setitem__(key, value)
+        self.sizes[key] = size
+        self.bytes += size
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.bytes -= self.sizes.pop(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+
+        value = super().pop(key)
+        self.bytes -= self.sizes.pop(key)
+        return value
+
+    def popitem(self, last=True):
+        key, value = super().popitem(last=last)
+        self.bytes -= self.sizes.pop(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+    @property
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            hits, misses, evictions, number of elements, and estimated bytes of the cache
+        """
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            size=len(self),
+            bytes=self.bytes,
+        )
+
+
+class DiskCache:
+    """Disk Cache -- sqlite store that can be shared by processes on the same node"""
+
+    def __init__(self, path, maxbytes=None):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the sqlite database file
+        maxbytes : int | None
+            maximum number of stored bytes, least recently used values are evicted first
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.maxbytes = float("inf") if maxbytes is None else int(maxbytes)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return dict(path=self.path, maxbytes=self.maxbytes)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        """sqlite connection of the current process and thread"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            folder = os.path.dirname(self.path)
+            if not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_atime ON cache (atime)")
+
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+        return self._local.conn
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone() is not None
+
+    def __getitem__(self, key):
+        row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+
+        self.conn.execute("UPDATE cache SET atime = ? WHERE key = ?", (time.time(), key))
+        return pickle_load(np.frombuffer(row[0], dtype=np.uint8))
+
+    def __setitem__(self, key, value):
+        value = pickle_save(value).tobytes()
+        size = len(value)
+
+        if size > self.maxbytes:
+            return
+
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, atime) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        if self.maxbytes == float("inf"):
+            return
+
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if total <= self.maxbytes:
+            return
+
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY atime ASC").fetchall():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.maxbytes:
+                break
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        self.conn.execute("DELETE FROM cache")
+
+
+class StripedCache:
+    """Cache that is split into independently locked stripes, for concurrent access by threads"""
+
+    def __init__(self, stripes=16, maxsize=None, maxbytes=None):
+        """
+        Parameters
+        ----------
+        stripes : int
+            number of independently locked stripes
+        maxsize : int | None
+            maximum number of cache elements, divided evenly across stripes
+        maxbytes : int | None
+            maximum estimated number of bytes of cache elements, divided evenly across stripes
+        """
+        n = int(stripes)
+        maxsize = None if maxsize is None else -(-int(maxsize) // n)
+        maxbytes = None if maxbytes is None else -(-int(maxbytes) // n)
+
+        self._stripes = [Cache(maxsize=maxsize, maxbytes=maxbytes) for _ in range(n)]
+        self._locks = [threading.Lock() for _ in range(n)]
+
+    def _index(self, key):
+        return hash(key) % len(self._stripes)
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        with self._locks[i]:
+            return self._stripes[i][key]
+
+    def __setitem__(self, key, value):
+        i = self._index(key)
+        with self._locks[i]:
+            self._stripes[i][key] = value
+
+    def __contains__(self, key):
+        i = self._index(key)
+        with self._locks[i]:
+            return key in self._stripes[i]
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self._stripes)
+
+    def clear(self):
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                stripe.clear()
+
+    @property
+    def evictions(self):
+        return sum(stripe.evictions for stripe in self._stripes)
+
+    @property
+    def bytes(self):
+        return sum(stripe.bytes for stripe in self._stripes)
+
+
+def persistent_name(obj):
+    """Name of a table, class, or function that is identical across processes"""
+    if isinstance(obj, type) and issubclass(obj, Table):
+        return obj.full_table_name
+
+    for x in getattr(obj, "__mro__", [obj]):
+        if not (x.__module__ == "djutils" or x.__module__.startswith("djutils.")):
+            return f"{x.__module__}.{x.__qualname__}"
+
+
+def _code(code):
+    consts = [_code(c) if isinstance(c, CodeType) else repr(c) for c in code.co_consts]
+    return code.co_code.hex() + repr(consts) + repr(code.co_names)
+
+
+def code_hash(func):
+    """Hash of the bytecode of a function that is identical across processes and changes when the function is edited
+
+    Edits of other functions that it calls are not detected.
+    """
+    code = getattr(func, "__code__", None)
+    return None if code is None else key_hash(dict(code=_code(code)))
+
+
+VALIDATED = 65536  # maximum number of remembered single row restrictions, if the cache size is unbounded
 
 
 class RowPropertyCache(Cache):
     """Row Property Cache"""
 
-    def get(self, row, method):
+    def __init__(self, maxsize=None, maxbytes=None, store=None):
+        """
+        Parameters
+        ----------
+        maxsize : int | None
+            maximum number of cache elements
+        maxbytes : int | None
+            maximum estimated number of bytes of cache elements
+        store : DiskCache | None
+            persistent store that backs the in-memory cache
+        """
+        super().__init__(maxsize=maxsize, maxbytes=maxbytes)
+        self.store = store
+        self.validated = Cache(maxsize=VALIDATED if maxsize is None else maxsize)
+
+    def _key(self, row, method, rowkey):
         cls = row.__class__
 
-        if issubclass(cls, Table):
-            key = key_hash(dict(row.fetch1("KEY"), _class=id(cls), _method=id(method)))
-        elif issubclass(cls, Keys):
-            key = key_hash(dict(row.key.fetch1("KEY"), _class=id(cls), _method=id(method)))
-        else:
+        if not issubclass(cls, (Table, Keys)):
             raise TypeError("Cached row property only works on subclasses of datajoint.Table or djutils.Keys")
 
+        return key_hash(dict(rowkey, _class=id(cls), _method=id(method)))
+
+    def lookup(self, row, method, rowkey):
+        """Cached row property, without computing it on a miss
+
+        Raises
+        ------
+        KeyError
+            if the row property is not cached
+        """
+        ret = self[self._key(row, method, rowkey)]
+        self.hits += 1
+        return ret
+
+    def get(self, row, method, rowkey=None):
+        """Cached row property, computed and cached on a miss"""
+        if rowkey is None:
+            rowkey = row.key.fetch1("KEY") if isinstance(row, Keys) else row.fetch1("KEY")
+
+        key = self._key(row, method, rowkey)
+
         try:
             ret = self[key]
+            self.hits += 1
+            return ret
         except KeyError:
+            self.misses += 1
+
+        if self.store is None:
             ret = method(row)
-            self[key] = ret
+        else:
+            cls = row.__class__
+            skey = key_hash(
+                dict(rowkey, _class=persistent_name(cls), _method=persistent_name(method), _code=code_hash(method))
+            )
+            try:
+                ret = self.store[skey]
+            except KeyError:
+                ret = method(row)
+                try:
+                    self.store[skey] = ret
+                except (pickle.PicklingError, TypeError, AttributeError, sqlite3.OperationalError) as e:
+                    logger.warning(f"{persistent_name(method)} is not persisted -- {e!r}")
+
+        self[key] = ret
+        return ret
+
+
+class SharedRowPropertyCache(RowPropertyCache):
+    """Row Property Cache that can be shared by threads -- values are held in a StripedCache
+
+    Row properties are computed outside of the locks, so concurrent misses of the same row may compute it twice.
+    Hit and miss counts are approximate under concurrency.
+    """
+
+    def __init__(self, stripes=16, maxsize=None, maxbytes=None, store=None):
+        """
+        Parameters
+        ----------
+        stripes : int
+            number of independently locked stripes
+        maxsize : int | None
+            maximum number of cache elements
+        maxbytes : int | None
+            maximum estimated number of bytes of cache elements
+        store : DiskCache | None
+            persistent store that backs the in-memory cache
+        """
+        super().__init__(store=store)
+        self.values = StripedCache(stripes=stripes, maxsize=maxsize, maxbytes=maxbytes)
+        self.validated = StripedCache(stripes=stripes, maxsize=VALIDATED if maxsize is None else maxsize)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def clear(self):
+        self.values.clear()
+        self.validated.clear()
+
+    @property
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.values.evictions,
+            size=len(self.values),
+            bytes=self.values.bytes,
+        )
+
+
+class QueryCache(Cache):
+    """Query Cache -- results of read queries keyed by SQL, invalidated by table versions
+
+    Table versions are counters that are incremented whenever a datajoint.Table of this process inserts, deletes, or
+    updates within a cache_queries scope (see invalidate and track_writes). Changes made by other processes are not
+    detected, except by djutils worker pools, which invalidate the tables they wrote to once they are done. Results
+    are returned as copies.
+    """
+
+    def get(self, kind, expr, *args, **kwargs):
+        """Cached result of a query, computed and cached on a miss
+
+        Parameters
+        ----------
+        kind : str
+            "fetch" | "fetch1" | "len"
+        expr : datajoint.QueryExpression
+            query expression
+        *args, **kwargs
+            passed to fetch or fetch1
+
+        Returns
+        -------
+        object
+            query result
+        """
+        sql = normalized_sql(expr)
+        key = (kind, sql, repr(args), repr(sorted(kwargs.items())))
+        tables = frozenset(_tables.findall(sql))
+
+        try:
+            ret, version = self[key]
+            if version == _version(tables):
+                self.hits += 1
+                return deepcopy(ret)
+        except KeyError:
+            pass
+
+        self.misses += 1
+        version = _version(tables)
+
+        if kind == "len":
+            ret = len(expr)
+        else:
+            ret = getattr(expr, kind)(*args, **kwargs)
+
+        self[key] = deepcopy(ret), version
         return ret
 
 
-rowproperty = None
+_tables = re.compile(r"`[^`]+`\.`[^`]+`")
+_aliases = re.compile(r"\) as `_[su][0-9a-f]+`")
+_versions = dict()
+_epoch = [0]
+
+
+def normalized_sql(expr):
+    """SQL of a query expression with the subquery and union aliases removed
+
+    datajoint names each subquery and union with a new alias every time that SQL is made, so the raw SQL of an
+    expression with subqueries or unions is different on each call.
+
+    Parameters
+    ----------
+    expr : datajoint.QueryExpression
+        query expression
+
+    Returns
+    -------
+    str
+        SQL that is identical for identical query expressions
+    """
+    return _aliases.sub(") as `_`", expr.make_sql())
+
+
+def _version(tables):
+    return _epoch[0], tuple(sorted((t, _versions.get(t, 0)) for t in tables))
+
+
+def invalidate(*tables):
+    """Invalidates cached query results that depend on tables
+
+    Parameters
+    ----------
+    *tables : datajoint.Table | type(datajoint.Table)
+        tables that were written to -- if none are provided, all cached query results are invalidated
+    """
+    if tables:
+        for table in tables:
+            name = table.full_table_name
+            _versions[name] = _versions.get(name, 0) + 1
+    else:
+        _epoch[0] += 1
+
+
+def _invalidating(method):
+    """Decorator of a datajoint.Table write method that invalidates cached query results of the table"""
+
+    @wraps(method)
+    def _method(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            invalidate(self)
+
+    return _method
+
+
+def track_writes(enable):
+    """Enables or disables invalidation of cached query results by datajoint.Table writes
+
+    datajoint.Table.insert, delete_quick, drop_quick, and _update are patched while at least one caller has enabled
+    tracking. Calls are serialized by a lock.
+    """
+    with track_writes.lock:
+        if enable:
+            if track_writes.users == 0:
+                for name in ["insert", "delete_quick", "drop_quick", "_update"]:
+                    method = getattr(Table, name, None)
+                    if method is not None:
+                        track_writes.wrapped[name] = method
+                        setattr(Table, name, _invalidating(method))
+            track_writes.users += 1
+        else:
+            track_writes.users -= 1
+            if track_writes.users == 0:
+                for name, method in track_writes.wrapped.items():
+                    setattr(Table, name, method)
+                track_writes.wrapped.clear()
+
+
+track_writes.users = 0
+track_writes.lock = threading.Lock()
+track_writes.wrapped = dict()
+
+
+def _expression(expr):
+    return expr() if isinstance(expr, type) else expr
+
+
+def fetch(expr, *args, **kwargs):
+    """expr.fetch(*args, **kwargs), cached if query caching is enabled"""
+    expr = _expression(expr)
+    cache = query.get()
+    return expr.fetch(*args, **kwargs) if cache is None else cache.get("fetch", expr, *args, **kwargs)
+
+
+def fetch1(expr, *args, **kwargs):
+    """expr.fetch1(*args, **kwargs), cached if query caching is enabled"""
+    expr = _expression(expr)
+    cache = query.get()
+    return expr.fetch1(*args, **kwargs) if cache is None else cache.get("fetch1", expr, *args, **kwargs)
+
+
+def count(expr):
+    """len(expr), cached if query caching is enabled"""
+    expr = _expression(expr)
+    cache = query.get()
+    return len(expr) if cache is None else cache.get("len", expr)
+
+
+rowproperty = ContextVar("rowproperty", default=None)
+query = ContextVar("query", default=None)
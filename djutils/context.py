@@ -1,22 +1,103 @@
 from contextlib import contextmanager
-from . import cache
+from . import cache, filters
 
 
 @contextmanager
-def cache_rowproperty(maxsize=None):
+def cache_rowproperty(maxsize=None, maxbytes=None, path=None, path_maxbytes=None, shared=None):
     """Enables cacheing of row properties
 
+    The cache is scoped to the current thread or asyncio task. To share a cache across threads,
+    create a cache.SharedRowPropertyCache and pass it as `shared` within each thread.
+
+    Parameters
+    ----------
+    maxsize : int | None
+        maximum number of cache elements
+    maxbytes : int | None
+        maximum estimated number of bytes of cache elements
+    path : str | None
+        path of a sqlite file that persists the cache and can be shared across processes, optional -- entries are
+        keyed by the bytecode of the row property, so they are not reused after it is edited, but edits of functions
+        that it calls are not detected
+    path_maxbytes : int | None
+        maximum number of bytes in the persistent cache
+    shared : djutils.cache.RowPropertyCache | None
+        existing cache to enable instead of creating one, optional
+
+    Yields
+    ------
+    djutils.cache.RowPropertyCache
+        enabled cache
+    """
+    rowcache = cache.rowproperty.get()
+
+    if shared is not None:
+        rowcache = shared
+
+    elif rowcache is None:
+        store = None if path is None else cache.DiskCache(path, maxbytes=path_maxbytes)
+        rowcache = cache.RowPropertyCache(maxsize=maxsize, maxbytes=maxbytes, store=store)
+
+    token = cache.rowproperty.set(rowcache)
+
+    try:
+        yield rowcache
+    finally:
+        cache.rowproperty.reset(token)
+
+
+@contextmanager
+def cache_queries(maxsize=None, maxbytes=None):
+    """Enables cacheing of djutils read queries
+
+    Results are keyed by SQL and invalidated when a table that the query depends on is written to by this process.
+    The cache is scoped to the current thread or asyncio task.
+
     Parameters
     ----------
-    maxsize : int | none
+    maxsize : int | None
         maximum number of cache elements
+    maxbytes : int | None
+        maximum estimated number of bytes of cache elements
+
+    Yields
+    ------
+    djutils.cache.QueryCache
+        enabled cache
     """
-    prev = cache.rowproperty
+    querycache = cache.query.get()
+
+    if querycache is None:
+        querycache = cache.QueryCache(maxsize=maxsize, maxbytes=maxbytes)
+
+    token = cache.query.set(querycache)
+    cache.track_writes(True)
+
+    try:
+        yield querycache
+    finally:
+        cache.track_writes(False)
+        cache.query.reset(token)
 
-    if prev is None:
-        cache.rowproperty = cache.RowPropertyCache(maxsize=maxsize)
+
+@contextmanager
+def profile_filters():
+    """Enables profiling of filters
+
+    Each filter invocation records its wall time, number of queries, and input and output cardinality. Counting the
+    cardinality costs two queries per invocation. The profile is scoped to the current thread or asyncio task.
+
+    Yields
+    ------
+    djutils.filters.FilterProfile
+        filter profile -- can be passed to FilterLinkSet.filter(reorder=...)
+    """
+    filterprofile = filters.FilterProfile()
+    token = filters.profile.set(filterprofile)
+    filters.count_queries(True)
 
     try:
-        yield
+        yield filterprofile
     finally:
-        cache.rowproperty = prev
+        filters.count_queries(False)
+        filters.profile.reset(token)
@@ -1,7 +1,50 @@
-from datajoint import Table, AndList
+from datajoint import Table, AndList, U
 from operator import mul
 from functools import reduce, wraps
 from .errors import RestrictionError
+from .utils import fetch_chunks
+
+
+def validate(instance, keys):
+    """Ensures that each key is restricted to a single tuple
+
+    The tuples of all keys are counted in a single query. For djutils.Keys instances, the validation is
+    remembered for the lifetime of the instance, and skipped for keys of an instance whose single item is known.
+
+    Parameters
+    ----------
+    instance : djutils.Keys | datajoint.Table
+        restricted keys or table
+    keys : Sequence[type(datajoint.Table)]
+        keys that must be restricted to a single tuple
+    """
+    if not keys:
+        return
+
+    if isinstance(instance, Keys):
+        if instance._item is not None and all(any(key is k for k in instance._plan["keys"]) for key in keys):
+            return
+
+        restriction = instance.key
+        memo = instance._validated
+    else:
+        restriction = instance
+        memo = None
+
+    keys = tuple(keys)
+
+    if memo is not None and keys in memo:
+        return
+
+    counts = [U().aggr(key & restriction, **{f"n{i}": "count(*)"}) for i, key in enumerate(keys)]
+    counts = reduce(mul, counts).fetch1()
+
+    for i, key in enumerate(keys):
+        if counts[f"n{i}"] != 1:
+            raise RestrictionError(f"{key.__name__} must be restricted to a single tuple.")
+
+    if memo is not None:
+        memo.add(keys)
 
 
 class keyproperty:
@@ -14,16 +57,10 @@ class keyproperty:
         @wraps(method)
         def _method(instance):
 
-            if isinstance(instance, Keys):
-                restriction = instance.key
-            elif isinstance(instance, Table):
-                restriction = instance
-            else:
+            if not isinstance(instance, (Keys, Table)):
                 raise TypeError("keyproperty only works on subclasses of djutils.Keys or datajoint.Table")
 
-            for key in self.keys:
-                if len(key & restriction) != 1:
-                    raise RestrictionError(f"{key.__name__} must be restricted to a single tuple.")
+            validate(instance, self.keys)
 
             return method(instance)
 
@@ -40,16 +77,10 @@ class keymethod:
         @wraps(method)
         def _method(instance, *args, **kwargs):
 
-            if isinstance(instance, Keys):
-                restriction = instance.key
-            elif isinstance(instance, Table):
-                restriction = instance
-            else:
+            if not isinstance(instance, (Keys, Table)):
                 raise TypeError("keymethod only works on subclasses of djutils.Keys or datajoint.Table")
 
-            for key in self.keys:
-                if len(key & restriction) != 1:
-                    raise RestrictionError(f"{key.__name__} must be restricted to a single tuple.")
+            validate(instance, self.keys)
 
             return method(instance, *args, **kwargs)
 
@@ -63,7 +94,7 @@ class KeysMeta(type):
         return cls() & arg
 
     def __getattribute__(cls, name):
-        if name in ["keys", "key_source", "primary_key"]:
+        if name in ["keys", "key_source", "heading", "primary_key"]:
             return cls().__getattribute__(name)
         else:
             return super().__getattribute__(name)
@@ -76,15 +107,46 @@ class Keys(metaclass=KeysMeta):
         self.restriction = AndList(restriction)
         self._key = None
         self._item = None
+        self._validated = set()
+
+    @property
+    def _plan(self):
+        """Joined key source and primary key, memoized per class until the keys change or reset is called"""
+        cls = self.__class__
+        keys = tuple(self.keys)
+        plan = cls.__dict__.get("_plan_")
+
+        if plan is None or len(plan["keys"]) != len(keys) or any(a is not b for a, b in zip(plan["keys"], keys)):
+            key_source = reduce(mul, [key.proj() for key in keys])
+            plan = dict(
+                keys=keys,
+                key_source=key_source,
+                heading=key_source.heading,
+                primary_key=list(key_source.primary_key),
+            )
+            type.__setattr__(cls, "_plan_", plan)
+
+        return plan
+
+    @classmethod
+    def reset(cls):
+        """Discards the memoized key source, e.g. after the key tables have been altered"""
+        if "_plan_" in cls.__dict__:
+            type.__delattr__(cls, "_plan_")
 
     @property
     def key_source(self):
-        return reduce(mul, [key.proj() for key in self.keys])
+        key_source = self._plan["key_source"]
+        return key_source.__class__(key_source)
+
+    @property
+    def heading(self):
+        return self._plan["heading"]
 
     @property
     def key(self):
         if self._key is None:
-            self._key = (self.key_source & self.restriction).proj()
+            self._key = (self._plan["key_source"] & self.restriction).proj()
         return self._key
 
     @property
@@ -95,11 +157,31 @@ class Keys(metaclass=KeysMeta):
 
     @property
     def primary_key(self):
-        return self.key_source.primary_key
+        return list(self._plan["primary_key"])
 
     def __and__(self, key):
         return self.__class__([*self.restriction, key])
 
+    def iter(self, chunk_size=1000):
+        """Iterates over the restricted items
+
+        Parameters
+        ----------
+        chunk_size : int | None
+            number of items fetched per query, None fetches all at once
+
+        Yields
+        ------
+        djutils.Keys
+            keys restricted to a single item, with the item already fetched
+        """
+        for items in fetch_chunks(self.key, chunk_size, self.primary_key):
+            for item in items:
+                keys = self & item
+                keys._key = self.key & item
+                keys._item = item
+                yield keys
+
     def __len__(self):
         return len(self.key)
 
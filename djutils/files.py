@@ -1,6 +1,8 @@
 import os
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datajoint.hash import uuid_from_file
 from .rows import rowmethod
+from .cache import Cache, DiskCache
 from .utils import key_hash, classproperty, from_camel_case, user_choice
 from .logging import logger
 
@@ -11,9 +13,74 @@ class Filepath:
     @classproperty
     def _checksums(cls):
         if not hasattr(cls, "_checksums_"):
-            cls._checksums_ = deque(maxlen=os.getenv("DJUTILS_FILEPATH_CACHE", 1024))
+            cls._checksums_ = Cache(maxsize=os.getenv("DJUTILS_FILEPATH_CACHE", 1024))
         return cls._checksums_
 
+    @classproperty
+    def _manifest(cls):
+        if not hasattr(cls, "_manifest_"):
+            path = os.getenv("DJUTILS_FILEPATH_MANIFEST")
+            cls._manifest_ = None if path is None else DiskCache(path)
+        return cls._manifest_
+
+    @classmethod
+    def _verified(cls, filepath, contents_hash):
+        """Whether the file was verified against its contents hash and has not changed since
+
+        Parameters
+        ----------
+        filepath : str
+            local filepath
+        contents_hash : uuid.UUID
+            contents hash of the external table
+
+        Returns
+        -------
+        bool
+            True -- verified | False -- requires verification
+        """
+        checksums = cls._checksums
+
+        if checksums.get(filepath) == contents_hash:
+            checksums.move_to_end(filepath)
+            return True
+
+        manifest = cls._manifest
+
+        if manifest is None:
+            return False
+
+        try:
+            size, mtime, checksum = manifest[filepath]
+            stat = os.stat(filepath)
+        except (KeyError, OSError):
+            return False
+
+        if (size, mtime, checksum) != (stat.st_size, stat.st_mtime_ns, str(contents_hash)):
+            return False
+
+        checksums[filepath] = contents_hash
+        return True
+
+    @classmethod
+    def _verify(cls, filepath, contents_hash):
+        """Records that the file was verified against its contents hash
+
+        Parameters
+        ----------
+        filepath : str
+            local filepath
+        contents_hash : uuid.UUID
+            contents hash of the external table
+        """
+        cls._checksums[filepath] = contents_hash
+
+        manifest = cls._manifest
+
+        if manifest is not None:
+            stat = os.stat(filepath)
+            manifest[filepath] = (stat.st_size, stat.st_mtime_ns, str(contents_hash))
+
     @classproperty
     def _tablepath(cls):
         return os.path.join(cls.database, from_camel_case(cls.__name__))
@@ -80,22 +147,85 @@ class Filepath:
 
     @rowmethod
     def filepath(self, attr, *, checksum=True):
-        """Fetches the filepath with optional checksum verification"""
+        """Fetches the filepath with optional checksum verification
 
+        Verified files are remembered in an LRU registry of size DJUTILS_FILEPATH_CACHE. If DJUTILS_FILEPATH_MANIFEST
+        is the path of a sqlite file, the size and modification time of verified files are also stored there, and files
+        that are unchanged since their verification are not checksummed again, including by other processes.
+        """
         store = self._filepaths[attr].store
         extern = self.external[store]
 
         key = self.proj(hash=attr)
-        filepath = (extern & key).fetch1("filepath")
+        filepath, contents_hash = (extern & key).fetch1("filepath", "contents_hash")
         filepath = os.path.join(extern.spec["location"], filepath)
 
-        if checksum and filepath not in self._checksums:
+        if checksum and not self._verified(filepath, contents_hash):
             _filepath = self.fetch1(attr)
             assert filepath == _filepath
-            self._checksums.append(filepath)
+            self._verify(filepath, contents_hash)
 
         return filepath
 
+    def filepaths(self, attr, *, checksum=True, threads=8):
+        """Fetches the filepaths of a restricted table with optional checksum verification
+
+        The table is joined with its external store in a single query. Files that are not already verified are
+        checksummed concurrently, and files that fail are fetched through datajoint one at a time.
+
+        Parameters
+        ----------
+        attr : str
+            filepath attribute
+        checksum : bool
+            verify the checksums of the files
+        threads : int
+            maximum number of files that are checksummed concurrently
+
+        Returns
+        -------
+        list[tuple[dict, str]]
+            primary key and filepath of each row, in primary key order
+        """
+        store = self._filepaths[attr].store
+        extern = self.external[store]
+        location = extern.spec["location"]
+
+        primary_key = self.primary_key
+        rows = (self.proj(hash=attr) * extern).fetch(
+            *primary_key, "filepath", "contents_hash", order_by=primary_key, as_dict=True
+        )
+
+        keys = [{k: row[k] for k in primary_key} for row in rows]
+        filepaths = [os.path.join(location, row["filepath"]) for row in rows]
+
+        if not checksum:
+            return list(zip(keys, filepaths))
+
+        hashes = [row["contents_hash"] for row in rows]
+        pending = [i for i, (f, h) in enumerate(zip(filepaths, hashes)) if not self._verified(f, h)]
+
+        def check(i):
+            try:
+                return uuid_from_file(filepaths[i]) == hashes[i]
+            except OSError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=max(1, int(threads))) as executor:
+            checks = list(executor.map(check, pending))
+
+        for i, passed in zip(pending, checks):
+            if not passed:
+                _filepath = (self & keys[i]).fetch1(attr)
+                assert filepaths[i] == _filepath
+
+            self._verify(filepaths[i], hashes[i])
+
+        if pending:
+            logger.info(f"Verified {len(pending)} of {len(filepaths)} files of {self.__class__.__name__}.{attr}")
+
+        return list(zip(keys, filepaths))
+
     @rowmethod
     def replace(self, row, *, prompt=True):
         """Replaces a row with optional user prompt"""
@@ -1,5 +1,10 @@
+import time
+import threading
+import datajoint as dj
+from contextvars import ContextVar
 from functools import wraps
 from .links import setup_link, setup_link_set
+from . import cache
 
 
 def decorate_filter(filt, filtertype):
@@ -11,7 +16,12 @@ def decorate_filter(filt, filtertype):
         if not (isinstance(key, filtertype) or key is filtertype):
             raise TypeError(f"Filter input must be {filtertype.__name__} instance or class.")
 
-        key = filt(self, key)
+        filterprofile = profile.get()
+
+        if filterprofile is None:
+            key = filt(self, key)
+        else:
+            key = filterprofile.run(filt, self, key)
 
         if not (isinstance(key, filtertype) or key is filtertype):
             raise TypeError(f"Filter output must be {filtertype.__name__} instance or class.")
@@ -21,10 +31,184 @@ def decorate_filter(filt, filtertype):
     return _filt
 
 
+def _count(tuples):
+    if isinstance(tuples, type):
+        tuples = tuples()
+    return len(tuples)
+
+
+class FilterProfile:
+    """Filter Profile -- wall time, query count and cardinality of filter invocations"""
+
+    def __init__(self):
+        self.records = []
+        self.queries = 0
+
+    def run(self, filt, table, tuples):
+        """Runs and records a filter invocation
+
+        Parameters
+        ----------
+        filt : Callable
+            undecorated filter method
+        table : Filter
+            filter table
+        tuples : dj.UserTable | djutils.Keys
+            tuples to be filtered
+
+        Returns
+        -------
+        dj.UserTable | djutils.Keys
+            restricted tuples
+        """
+        n_input = _count(tuples)
+
+        queries = self.queries
+        start = time.perf_counter()
+        tuples = filt(table, tuples)
+        seconds = time.perf_counter() - start
+        queries = self.queries - queries
+
+        start = time.perf_counter()
+        n_output = _count(tuples)
+        evaluation = time.perf_counter() - start
+
+        self.records.append(
+            dict(
+                filter=table.make_sql(),
+                name=table.__class__.__name__,
+                seconds=seconds,
+                evaluation=evaluation,
+                queries=queries,
+                input=n_input,
+                output=n_output,
+            )
+        )
+        return tuples
+
+    @property
+    def stats(self):
+        """
+        Returns
+        -------
+        dict[str, dict]
+            SQL of the filter table -> name, number of calls, total seconds of the filter calls and of evaluating
+            their outputs, total number of queries made by the filter calls, total input and output cardinality,
+            and selectivity (output / input)
+        """
+        stats = dict()
+
+        for record in self.records:
+            s = stats.setdefault(
+                record["filter"],
+                dict(name=record["name"], calls=0, seconds=0, evaluation=0, queries=0, input=0, output=0),
+            )
+            s["calls"] += 1
+            for k in ["seconds", "evaluation", "queries", "input", "output"]:
+                s[k] += record[k]
+
+        for s in stats.values():
+            s["selectivity"] = s["output"] / s["input"] if s["input"] else 1.0
+
+        return stats
+
+    def rank(self, filt, stats=None):
+        """Rank of a filter for reordering -- cost per fraction of discarded tuples, lower runs first
+
+        Parameters
+        ----------
+        filt : Filter
+            filter table
+        stats : dict | None
+            precomputed FilterProfile.stats, optional
+
+        Returns
+        -------
+        float | None
+            rank, or None if the filter was not profiled
+        """
+        stats = self.stats if stats is None else stats
+        s = stats.get(filt.make_sql())
+
+        if s is None:
+            return
+        elif s["selectivity"] >= 1:
+            return float("inf")
+        else:
+            return (s["seconds"] + s["evaluation"]) / s["calls"] / (1 - s["selectivity"])
+
+
+def reorder_filters(filters, filterprofile):
+    """Reorders consecutive commutative filters by their profiled rank
+
+    Parameters
+    ----------
+    filters : List[Filter]
+        filter tables, in order
+    filterprofile : FilterProfile
+        profile of previous filter invocations
+
+    Returns
+    -------
+    List[Filter]
+        reordered filter tables -- filters that are not commutative keep their position
+    """
+    stats = filterprofile.stats
+    ranks = [filterprofile.rank(filt, stats) for filt in filters]
+    order = []
+    run = []
+
+    def flush():
+        known = sorted((r, i) for i, r in run if r is not None)
+        unknown = [i for i, r in run if r is None]
+        order.extend([i for _, i in known] + unknown)
+        run.clear()
+
+    for i, filt in enumerate(filters):
+        if getattr(filt, "commutative", False):
+            run.append((i, ranks[i]))
+        else:
+            flush()
+            order.append(i)
+
+    flush()
+    return [filters[i] for i in order]
+
+
+def _query(self, *args, **kwargs):
+    filterprofile = profile.get()
+    if filterprofile is not None:
+        filterprofile.queries += 1
+    return _query.wrapped(self, *args, **kwargs)
+
+
+def count_queries(enable):
+    """Enables or disables counting of queries by the active FilterProfile
+
+    datajoint.Connection.query is patched while at least one caller has enabled counting. Calls are serialized by
+    a lock, so that threads which enable counting concurrently patch it only once.
+    """
+    with _query.lock:
+        if enable:
+            if _query.users == 0 and dj.Connection.query is not _query:
+                _query.wrapped = dj.Connection.query
+                dj.Connection.query = _query
+            _query.users += 1
+        else:
+            _query.users -= 1
+            if _query.users == 0:
+                dj.Connection.query = _query.wrapped
+
+
+_query.users = 0
+_query.lock = threading.Lock()
+profile = ContextVar("profile", default=None)
+
+
 class Filter:
     """Filter"""
 
-    pass
+    commutative = False
 
 
 class FilterLink:
@@ -49,22 +233,58 @@ class FilterLink:
 class FilterLinkSet:
     """Filter Link Set"""
 
-    def filter(self, tuples):
+    @property
+    def filters(self):
+        """
+        Returns
+        -------
+        List[Filter]
+            filters of the set members, each restricted to a single row, in order of link key
+        """
+        link = self.link
+        attr = f"{link.name}_id"
+        members = self.members
+        filters = dict()
+
+        for link_type in cache.fetch(dj.U(f"{link.name}_type") & (link & members), f"{link.name}_type"):
+            part = link.parts[link_type]
+            table = part._link
+
+            for row in cache.fetch((part & members) * table, as_dict=True):
+                filters[row[attr]] = table & {k: row[k] for k in table.primary_key}
+
+        return [filters[k] for k in sorted(filters)]
+
+    def filter(self, tuples, *, short_circuit=False, reorder=None):
         """Filter tuples via links
 
+        The filters of all members are resolved in bulk, with one query per link type.
+
         Parameters
         ----------
         tuples : dj.UserTable
             tuples to be filtered
+        short_circuit : bool
+            whether to stop once no tuples remain, which costs a query per filter
+        reorder : FilterProfile | None
+            profile used to reorder consecutive commutative filters, so that cheap and selective filters run first
 
         Parameters
         ----------
         dj.UserTable
             restricted tuples
         """
-        for key in self.members.fetch("KEY", order_by=self.link.primary_key):
+        filters = self.filters
+
+        if reorder is not None:
+            filters = reorder_filters(filters, reorder)
+
+        for filt in filters:
+
+            tuples = filt.filter(tuples)
 
-            tuples = (self.link & key).filter(tuples)
+            if short_circuit and not tuples:
+                break
 
         return tuples
 
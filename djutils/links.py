@@ -1,9 +1,14 @@
+import os
+import time
 import datajoint as dj
+from contextlib import nullcontext
 from .resolve import foreigns
-from .utils import key_hash
+from .utils import classproperty, key_hashes, fetch_chunks, user_choice
 from .sets import setup_set
 from .lists import setup_list
+from .parallel import imap
 from .logging import logger
+from . import cache
 from .errors import MissingError
 
 
@@ -32,21 +37,108 @@ def part_definition(foreign):
 
 class Link(dj.Lookup):
     @classmethod
-    def fill(cls):
-        """Inserts tuples into self and part tables"""
-        for table in cls.tables:
-            getattr(cls, table).fill()
+    def fill(cls, chunk_size=None, processes=1):
+        """Inserts tuples into self and part tables
+
+        Parameters
+        ----------
+        chunk_size : int | None
+            passed to Part.fill
+        processes : int | None
+            number of processes that fill parts concurrently, each with its own database connection
+            -- None defaults to the number of cpus, at most one process per part
+
+        Returns
+        -------
+        dict[str, int]
+            number of inserted keys per part
+        """
+
+        def fill(table):
+            return getattr(cls, table).fill(chunk_size=chunk_size)
+
+        tables = list(cls.tables)
+        processes = min(os.cpu_count() if processes is None else processes, len(tables))
+        inserted = list(imap(fill, tables, cls.connection, processes=processes))
+
+        cache.invalidate(cls, *cls.parts.values())
+
+        return dict(zip(tables, inserted))
 
     @classmethod
-    def clean(cls):
-        """Deletes tuples from self that are missing in links"""
-        keys = []
-        for table in cls.tables:
-            part = getattr(cls, table)
+    def clean(cls, chunk_size=1000, *, dry_run=False, prompt=None):
+        """Deletes tuples from self that are missing in links
+
+        Orphaned tuples are found with an anti-join on the database and deleted in batches. Deletes cascade to
+        dependent tables, e.g. members of link sets and lists. If prompted, the first batch is deleted in a transaction
+        that lists the tuples deleted from every dependent table, and the user is asked whether to commit it and
+        delete the remaining batches as well.
+
+        Parameters
+        ----------
+        chunk_size : int
+            maximum number of tuples deleted per batch
+        dry_run : bool
+            whether to only count the orphaned tuples
+        prompt : bool | None
+            whether to prompt the user before deleting -- None defaults to dj.config["safemode"]
+
+        Returns
+        -------
+        int
+            number of deleted tuples, or number of orphaned tuples if dry_run
+        """
+        orphans = dict()
+        for table, part in cls.parts.items():
             master = cls & {f"{cls.name}_type": part.__name__}
-            keys += (master - part).fetch(dj.key)
+            orphans[table] = master - part
 
-        (cls & keys).delete()
+        counts = {table: len(orphan) for table, orphan in orphans.items()}
+        n = sum(counts.values())
+
+        for table, count in counts.items():
+            logger.info(f"{cls.__name__}.{table} -- {count} orphaned tuples")
+
+        if dry_run or not n:
+            return n
+
+        prompt = dj.config["safemode"] if prompt is None else prompt
+        connection = cls.connection
+        deleted = 0
+
+        for table, orphan in orphans.items():
+            if not counts[table]:
+                continue
+
+            for keys in fetch_chunks(orphan.proj(), chunk_size):
+                if prompt:
+                    connection.start_transaction()
+
+                try:
+                    with dj.config(safemode=False):
+                        (cls & keys).delete(verbose=prompt)
+                except BaseException:
+                    if prompt:
+                        connection.cancel_transaction()
+                    raise
+
+                if prompt:
+                    choice = user_choice(
+                        f"The deletes above are for {len(keys)} of {n} orphaned {cls.__name__} tuples. "
+                        f"Delete all {n} orphaned tuples and their dependent tuples?"
+                    )
+                    if choice != "yes":
+                        connection.cancel_transaction()
+                        return 0
+
+                    connection.commit_transaction()
+                    prompt = False
+
+                deleted += len(keys)
+
+                logger.info(f"{cls.__name__} -- Deleted {deleted} of {n} orphaned tuples")
+
+        return deleted
 
     @property
     def link(self):
@@ -54,56 +146,121 @@ class Link(dj.Lookup):
 
         IMPORTANT: must be restricted to a single row
         """
-        key, link_type = self.fetch1(dj.key, f"{self.name}_type")
+        key, link_type = cache.fetch1(self, dj.key, f"{self.name}_type")
         part = getattr(self, link_type) & key
         return part.link
 
+    @property
+    def linked(self):
+        """Restricted linked tables, grouped by link type
+
+        Returns
+        -------
+        dict[str, dj.UserTable]
+            link type -> linked table restricted by the links of that type
+        """
+        attr = f"{self.name}_type"
+        types = cache.fetch(dj.U(attr) & self, attr)
+
+        return {t: getattr(self, t)._link & (getattr(self, t) & self) for t in sorted(types)}
+
+    def linked_rows(self, chunk_size=None):
+        """Streams the linked rows, joining each part with its linked table once
+
+        Parameters
+        ----------
+        chunk_size : int | None
+            number of rows fetched per query, None fetches all rows of a link type at once
+
+        Yields
+        ------
+        dict
+            link key
+        dict
+            linked row
+        """
+        attr = f"{self.name}_id"
+        types = cache.fetch(dj.U(f"{self.name}_type") & self, f"{self.name}_type")
+
+        for t in sorted(types):
+            part = getattr(self, t)
+            rows = (part & self) * part._link
+            names = part._link.heading.names
+
+            for chunk in fetch_chunks(rows, chunk_size, [attr]):
+                for row in chunk:
+                    yield {attr: row[attr]}, {k: row[k] for k in names}
+
+    @classproperty
+    def parts(cls):
+        """
+        Returns
+        -------
+        dict[str, djutils.links.Part]
+            link type -> part table, memoized per class
+        """
+        if "_parts_" not in cls.__dict__:
+            cls._parts_ = {table: getattr(cls, table) for table in cls.tables}
+        return cls._parts_
+
     @classmethod
-    def query(cls, link_type, link_key=None):
+    def query(cls, link_type=None, link_key=None, *, check=False):
         """
         Parameters
         ----------
-        link_type : str
-            link type
+        link_type : str | Sequence[str] | None
+            link type(s) -- None queries all link types
         link_key : datajoint restriction | None
             link key, optional
+        check : bool
+            whether to raise MissingError if no links are found, which costs a query
 
         Returns
         -------
         djutils.links.Link
-            link table restricted by link type, and optionally restricted by link key
+            link table restricted by link type(s), and optionally restricted by link key
         """
-        keys = cls & {f"{cls.name}_type": link_type}
-        if not keys:
-            raise MissingError("Link type does not exist.")
+        parts = cls.parts
+
+        if link_type is None:
+            link_types = list(parts)
+        elif isinstance(link_type, str):
+            link_types = [link_type]
+        else:
+            link_types = list(link_type)
 
-        part = getattr(cls, link_type)
-        links = part * part._link if link_key is None else part * part._link & link_key
-        if not links:
+        for t in link_types:
+            if t not in parts:
+                raise MissingError(f"Link type {t} does not exist.")
+
+        if link_key is None:
+            links = [parts[t] for t in link_types]
+        else:
+            links = [(parts[t] * parts[t]._link & link_key).proj() for t in link_types]
+
+        keys = cls & links
+
+        if check and not cache.count(keys):
             raise MissingError("No links found.")
 
-        return keys & links
+        return keys
 
 
 class Part(dj.Part):
     @classmethod
-    def fill(cls):
-        """
-        Inserts tuples into self and the master table
-        """
-        keys = (cls._link - cls).fetch(dj.key)
-
-        if keys:
-            logger.info(f"{cls.__name__} -- Inserting {len(keys)} keys")
+    def _insert(cls, keys):
+        master = cls.master
+        name = master.name
+        length = master.length
 
-            master = cls.master
-            name = master.name
-            length = master.length
+        cls_type = {f"{name}_type": cls.__name__}
+        hashes = key_hashes([dict(k, **cls_type) for k in keys])
+        hashes = [{f"{name}_id": p[:length]} for p in hashes]
 
-            cls_type = {f"{name}_type": cls.__name__}
-            hashes = [key_hash(dict(k, **cls_type)) for k in keys]
-            hashes = [{f"{name}_id": p[:length]} for p in hashes]
+        connection = cls.connection
+        transaction = nullcontext() if connection.in_transaction else connection.transaction
 
+        with transaction:
             master.insert(
                 [dict(**h, **cls_type) for h in hashes],
                 skip_duplicates=True,
@@ -112,17 +269,56 @@ class Part(dj.Part):
                 [dict(**h, **k) for h, k in zip(hashes, keys)],
                 skip_duplicates=True,
             )
+            inserted = connection.query("SELECT ROW_COUNT()").fetchone()[0]
+
+        return inserted
+
+    @classmethod
+    def fill(cls, chunk_size=None):
+        """
+        Inserts tuples into self and the master table
+
+        Parameters
+        ----------
+        chunk_size : int | None
+            None -- missing keys are fetched and inserted at once | int -- missing keys are fetched and inserted in
+            chunks, each chunk in its own transaction
+
+        Returns
+        -------
+        int
+            number of inserted keys
+        """
+        missing = (cls._link - cls).proj()
+        start = time.time()
+        inserted = 0
 
+        for keys in fetch_chunks(missing, chunk_size, cls._link.primary_key):
+            n = cls._insert(keys)
+            inserted += n
+
+            if n < len(keys):
+                logger.warning(f"{cls.__name__} -- {len(keys) - n} keys could not be inserted")
+
+            if chunk_size is not None:
+                rate = inserted / max(time.time() - start, 1e-9)
+                logger.info(f"{cls.__name__} -- Inserted {inserted} keys ({rate:.0f} keys/s)")
+
+        if inserted:
+            rate = inserted / max(time.time() - start, 1e-9)
+            logger.info(f"{cls.__name__} -- Inserted {inserted} keys in total ({rate:.0f} keys/s)")
         else:
             logger.info(f"{cls.__name__} -- No new keys to insert")
 
+        return inserted
+
     @property
     def link(self):
         """Restricted linked table
 
         IMPORTANT: must be restricted to a single row
         """
-        return self._link & self.fetch1()
+        return self._link & cache.fetch1(self)
 
 
 def setup_link(cls, schema):
@@ -1,10 +1,13 @@
 import datajoint as dj
+from collections import defaultdict
+from collections.abc import Mapping
 from operator import mul
 from functools import reduce
 from .resolve import foreigns
-from .utils import classproperty, key_hash, user_choice
+from .utils import classproperty, key_hash, key_hashes, user_choice
 from .errors import MissingError
 from .logging import logger
+from . import cache
 
 
 def master_definition(name, comment, length):
@@ -45,6 +48,83 @@ class List(dj.Lookup):
     def key_source(cls):
         return reduce(mul, [key.proj() for key in cls.keys])
 
+    @classmethod
+    def digest(cls, keys):
+        """
+        Parameters
+        ----------
+        keys : List[dict]
+            member keys, in list order
+
+        Returns
+        -------
+        dict
+            list key -- content hash of the member keys and their order
+        """
+        key = dict(enumerate(key_hashes(keys)))
+        return {f"{cls.name}_id": key_hash(key)}
+
+    @classmethod
+    def resolve(cls, restrictions, chunk_size=1000):
+        """Resolves each restriction to a single row of key_source
+
+        Mapping restrictions are resolved in bulk with one query per chunk, and matched to the fetched rows by their
+        values. Other restrictions, and mappings that do not match exactly one fetched row, are resolved individually.
+
+        Parameters
+        ----------
+        restrictions : List[datajoint restriction]
+            each restriction must restrict the key_source to a single row
+        chunk_size : int
+            number of restrictions resolved per query
+
+        Returns
+        -------
+        List[dict]
+            key_source rows, in the order of the restrictions
+        """
+        key_source = cls.key_source
+        names = set(key_source.heading.names)
+
+        restrictions = list(restrictions)
+        keys = [None] * len(restrictions)
+
+        for start in range(0, len(restrictions), chunk_size):
+
+            chunk = []
+            for i, restriction in enumerate(restrictions[start : start + chunk_size], start):
+                if isinstance(restriction, Mapping):
+                    attrs = tuple(sorted(k for k in restriction if k in names))
+                    if attrs:
+                        chunk.append([i, restriction, attrs])
+
+            if not chunk:
+                continue
+
+            rows = cache.fetch(key_source & [restriction for _, restriction, _ in chunk], as_dict=True)
+            index = dict()
+
+            for i, restriction, attrs in chunk:
+                try:
+                    if attrs not in index:
+                        index[attrs] = defaultdict(list)
+                        for row in rows:
+                            index[attrs][tuple(row[a] for a in attrs)].append(row)
+
+                    matches = index[attrs].get(tuple(restriction[a] for a in attrs), [])
+
+                except TypeError:
+                    continue
+
+                if len(matches) == 1:
+                    keys[i] = matches[0]
+
+        for i, restriction in enumerate(restrictions):
+            if keys[i] is None:
+                keys[i] = cache.fetch1(cls.key_source.restrict(restriction))
+
+        return keys
+
     @property
     def members(self):
         """
@@ -53,10 +133,10 @@ class List(dj.Lookup):
         List.Member
             rows that make up the list
         """
-        key, n = self.fetch1(dj.key, "members")
+        key, n = cache.fetch1(self, dj.key, "members")
         members = self.Member & key
 
-        if len(members) == n:
+        if cache.count(members) == n:
             return members
         else:
             raise MissingError("Members are missing.")
@@ -77,11 +157,10 @@ class List(dj.Lookup):
         dict | None
             list key
         """
-        keys = [cls.key_source.restrict(_).fetch1() for _ in restrictions]
+        keys = cls.resolve(restrictions)
         n = len(keys)
 
-        key = {i: key_hash(k) for i, k in enumerate(keys)}
-        key = {f"{cls.name}_id": key_hash(key)}
+        key = cls.digest(keys)
 
         if cls & key:
             assert (cls & key).fetch1("members") == len(cls.Member & key)
@@ -124,7 +203,8 @@ class List(dj.Lookup):
 
     @classmethod
     def get(cls, restrictions):
-        """
+        """Looks up the list by the ordered content hash of the resolved members
+
         Parameters
         ----------
         restrictions : List[datajoint restriction]
@@ -135,18 +215,12 @@ class List(dj.Lookup):
         dict
             list key
         """
-        keys = [cls.key_source.restrict(_).fetch1() for _ in restrictions]
-        n = len(keys)
+        keys = cls.resolve(restrictions)
 
-        if n:
-            candidates = cls & f"members = {n}"
-            members = cls.Member & keys
-            key = candidates.aggr(members, n="count(*)") & f"n = {n}"
-        else:
-            key = cls & "members = 0"
+        key = cache.fetch(cls & cls.digest(keys), dj.key)
 
         if key:
-            return key.fetch1(dj.key)
+            return key[0]
         else:
             raise MissingError("List does not exist.")
 
@@ -1,6 +1,9 @@
 import datajoint as dj
 from functools import wraps
 from .errors import RestrictionError
+from .cache import StripedCache
+from . import cache
+from .parallel import imap
 
 
 def definition(name, comment):
@@ -12,13 +15,56 @@ def definition(name, comment):
     )
 
 
+def _local(restriction):
+    """Whether a restriction consists only of mappings and strings, i.e. does not depend on other tables"""
+    if isinstance(restriction, dj.AndList):
+        return all(_local(r) for r in restriction)
+    else:
+        return isinstance(restriction, (dict, str))
+
+
+def restricted_names(table):
+    """Method names in the restriction of a method table
+
+    Method tables are lookup tables whose contents are defined by the class, so restrictions by mappings and strings
+    are memoized per restriction for the lifetime of the class. Other restrictions may depend on tables that change,
+    and are fetched with cache.fetch, which is cached and invalidated within a cache_queries scope.
+
+    Parameters
+    ----------
+    table : Method
+        restricted method table
+
+    Returns
+    -------
+    frozenset[str]
+        method names
+    """
+    cls = table if isinstance(table, type) else table.__class__
+    table = table() if isinstance(table, type) else table
+
+    if not _local(table.restriction):
+        return frozenset(cache.fetch(table, table.name))
+
+    if "_names_" not in cls.__dict__:
+        cls._names_ = StripedCache(maxsize=1024)
+
+    sql = table.make_sql()
+    try:
+        return cls._names_[sql]
+    except KeyError:
+        names = frozenset(table.fetch(table.name))
+        cls._names_[sql] = names
+        return names
+
+
 def decorate_method(method, name):
     """Decorator that ensures that the table contains the method tuple before calling the method"""
 
     @wraps(method)
     def _method(self, *args, **kwargs):
 
-        if name not in self.fetch(self.name):
+        if name not in restricted_names(self):
             raise RestrictionError(f"Table restriction does not include '{name}'")
 
         return method(self, *args, **kwargs)
@@ -32,7 +78,7 @@ def decorate_property(prop, name):
     @wraps(prop)
     def _property(self):
 
-        if name not in self.fetch(self.name):
+        if name not in restricted_names(self):
             raise RestrictionError(f"Table restriction does not include '{name}'")
 
         return prop.fget(self)
@@ -40,6 +86,39 @@ def decorate_property(prop, name):
     return property(_property)
 
 
+class Method:
+    """Method"""
+
+    def dispatch(self, *args, processes=None, **kwargs):
+        """Calls every method in the restriction with the same input
+
+        Parameters
+        ----------
+        *args, **kwargs
+            passed to each method -- properties are evaluated without arguments
+        processes : int | None
+            number of forked processes, each with its own database connection -- None calls the methods in the
+            current process
+
+        Returns
+        -------
+        dict[str, object]
+            method name -> result
+        """
+        names = sorted(restricted_names(self))
+        properties = {name for name in names if isinstance(getattr(self.__class__, name), property)}
+
+        def call(name):
+            if name in properties:
+                return getattr(self, name)
+            else:
+                return getattr(self, name)(*args, **kwargs)
+
+        results = list(imap(call, names, self.connection, processes=processes or 1))
+
+        return dict(zip(names, results))
+
+
 def setup_method(cls, schema):
 
     contents = []
@@ -70,7 +149,7 @@ def setup_method(cls, schema):
         **methods,
     )
 
-    cls = type(cls.__name__, (cls, dj.Lookup), attr)
+    cls = type(cls.__name__, (cls, Method, dj.Lookup), attr)
     cls = schema(cls)
 
     return cls
@@ -0,0 +1,103 @@
+import os
+import multiprocessing
+from .rows import row_caller
+from .derived import Keys
+
+_state = dict()
+
+
+def _initialize(connection):
+    connection.connect()
+
+
+def _work(task):
+    return _state["func"](task)
+
+
+def imap(func, tasks, connection, processes=None, ordered=True):
+    """Maps a function over tasks with a pool of forked processes, each with its own database connection
+
+    Parameters
+    ----------
+    func : Callable
+        function of a task -- inherited by the forked processes, so it does not need to be picklable
+    tasks : Sequence
+        picklable tasks
+    connection : datajoint.Connection
+        connection that is reopened by each process
+    processes : int | None
+        number of worker processes, defaults to the number of cpus -- 1 runs in the current process
+    ordered : bool
+        True -- results are yielded in the order of tasks | False -- results are yielded as they are completed
+
+    Yields
+    ------
+    object
+        value of the function for each task
+    """
+    processes = os.cpu_count() if processes is None else int(processes)
+
+    if processes <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    _state.update(func=func)
+    context = multiprocessing.get_context("fork")
+
+    try:
+        with context.Pool(processes=processes, initializer=_initialize, initargs=(connection,)) as pool:
+            yield from pool.imap(_work, tasks) if ordered else pool.imap_unordered(_work, tasks)
+    finally:
+        _state.clear()
+
+
+def map(fn, table, *args, processes=None, chunk_size=100, ordered=True, **kwargs):
+    """Maps a function over the rows of a restricted table with a pool of processes
+
+    Primary keys are fetched once and partitioned into chunks. Worker processes are forked, and each one opens
+    its own connection to the database.
+
+    Parameters
+    ----------
+    fn : Callable[[datajoint.Table | djutils.Keys], object] | str
+        function of a single row, or name of a rowproperty or rowmethod that is evaluated without the single row check
+    table : datajoint.Table | djutils.Keys
+        restricted table
+    *args, **kwargs
+        passed to the rowmethod
+    processes : int | None
+        number of worker processes, defaults to the number of cpus -- 1 runs in the current process
+    chunk_size : int
+        number of rows per task sent to a worker process
+    ordered : bool
+        True -- results are yielded in primary key order | False -- results are yielded as they are completed
+
+    Yields
+    ------
+    dict
+        primary key of the row
+    object
+        value of the function for the row
+    """
+    if isinstance(table, type):
+        table = table()
+
+    if isinstance(fn, str):
+        call = row_caller(table, fn, *args, **kwargs)
+    else:
+
+        def call(row, key):
+            return fn(row)
+
+    rows = table.key if isinstance(table, Keys) else table
+    keys = rows.fetch("KEY", order_by=rows.primary_key)
+
+    chunk_size = max(1, int(chunk_size))
+    chunks = [keys[i : i + chunk_size] for i in range(0, len(keys), chunk_size)]
+
+    def work(keys):
+        return [(key, call(table & key, key)) for key in keys]
+
+    for result in imap(work, chunks, rows.connection, processes=processes, ordered=ordered):
+        yield from result
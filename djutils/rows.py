@@ -1,19 +1,104 @@
 from functools import wraps
+from datajoint import AndList
 from .errors import RestrictionError
+from .derived import Keys
+from .utils import fetch_chunks
 from . import cache
 
 
+def restriction_key(table):
+    """Primary key implied by the restriction of a table, derived without querying the database
+
+    Parameters
+    ----------
+    table : datajoint.Table | djutils.Keys
+        restricted table
+
+    Returns
+    -------
+    dict | None
+        primary key, or None if the restriction does not consist of mappings that specify the primary key
+    """
+    heading = table.heading
+    restriction = getattr(table, "restriction", None)
+
+    if not restriction:
+        return
+
+    key = dict()
+    stack = list(restriction)
+
+    while stack:
+        item = stack.pop()
+
+        if isinstance(item, AndList):
+            stack.extend(item)
+            continue
+
+        if not isinstance(item, dict):
+            return
+
+        for k, v in item.items():
+            if k not in heading.names:
+                continue
+            if k not in heading.primary_key:
+                return
+            if key.setdefault(k, v) != v:
+                return
+
+    if len(key) == len(heading.primary_key):
+        return key
+
+
+def row_key(table):
+    """Primary key of a table that is restricted to a single row
+
+    Fetches at most two keys instead of counting the restriction. Within a cache_rowproperty scope,
+    the key of each validated restriction is remembered and no query is issued.
+
+    Parameters
+    ----------
+    table : datajoint.Table | djutils.Keys
+        table restricted to a single row
+
+    Returns
+    -------
+    dict
+        primary key of the row
+    """
+    rows = table.key if isinstance(table, Keys) else table
+    rowcache = cache.rowproperty.get()
+    memo = None if rowcache is None else rowcache.validated
+
+    if memo is not None:
+        sql = cache.normalized_sql(rows)
+        try:
+            return memo[sql]
+        except KeyError:
+            pass
+
+    keys = rows.fetch("KEY", limit=2)
+
+    if len(keys) != 1:
+        raise RestrictionError("Table must be restricted to single row.")
+
+    if memo is not None:
+        memo[sql] = keys[0]
+
+    return keys[0]
+
+
 def rowmethod(method):
     """Decorator that ensures that the table is restricted to a single row before calling method"""
 
     @wraps(method)
     def _method(self, *args, **kwargs):
 
-        if len(self) != 1:
-            raise RestrictionError("Table must be restricted to single row.")
+        row_key(self)
 
         return method(self, *args, **kwargs)
 
+    _method._rowmethod = method
     return _method
 
 
@@ -23,12 +108,99 @@ def rowproperty(method):
     @wraps(method)
     def _method(self):
 
-        if len(self) != 1:
-            raise RestrictionError("Table must be restricted to single row.")
+        rowcache = cache.rowproperty.get()
 
-        if cache.rowproperty is None:
+        if rowcache is None:
+            row_key(self)
             return method(self)
-        else:
-            return cache.rowproperty.get(self, method)
 
+        key = restriction_key(self)
+
+        if key is not None:
+            try:
+                return rowcache.lookup(self, method, key)
+            except KeyError:
+                pass
+
+        return rowcache.get(self, method, row_key(self))
+
+    _method._rowproperty = method
     return property(_method)
+
+
+def row_caller(table, name, *args, **kwargs):
+    """Function that evaluates a rowproperty or rowmethod on a row without the single row check
+
+    Parameters
+    ----------
+    table : datajoint.Table | djutils.Keys
+        table that defines the rowproperty or rowmethod
+    name : str
+        name of the rowproperty or rowmethod
+    *args, **kwargs
+        passed to the rowmethod
+
+    Returns
+    -------
+    Callable[[datajoint.Table | djutils.Keys, dict], object]
+        function of a single row and its primary key
+    """
+    cls = table if isinstance(table, type) else table.__class__
+    attr = getattr(cls, name)
+
+    if isinstance(attr, property) and hasattr(attr.fget, "_rowproperty"):
+        method = attr.fget._rowproperty
+
+        def call(row, key):
+            rowcache = cache.rowproperty.get()
+            if rowcache is None:
+                return method(row)
+            else:
+                return rowcache.get(row, method, key)
+
+    elif hasattr(attr, "_rowmethod"):
+        method = attr._rowmethod
+
+        def call(row, key):
+            return method(row, *args, **kwargs)
+
+    else:
+        raise TypeError(f"{name} is not a rowproperty or rowmethod.")
+
+    return call
+
+
+def evaluate(table, name, *args, chunk_size=1000, **kwargs):
+    """Evaluates a rowproperty or rowmethod for every row of a restricted table
+
+    Primary keys are fetched in chunks, and the single row check is skipped for each row.
+    Row properties are stored in the row property cache, if it is enabled.
+
+    Parameters
+    ----------
+    table : datajoint.Table | djutils.Keys
+        restricted table
+    name : str
+        name of the rowproperty or rowmethod
+    *args, **kwargs
+        passed to the rowmethod
+    chunk_size : int | None
+        number of primary keys fetched per query, None fetches all at once
+
+    Yields
+    ------
+    dict
+        primary key of the row
+    object
+        value of the rowproperty or rowmethod for the row
+    """
+    if isinstance(table, type):
+        table = table()
+
+    call = row_caller(table, name, *args, **kwargs)
+
+    rows = table.key if isinstance(table, Keys) else table
+
+    for keys in fetch_chunks(rows.proj(), chunk_size):
+        for key in keys:
+            yield key, call(table & key, key)
@@ -1,10 +1,14 @@
+import hashlib
 import datajoint as dj
+from datajoint.declare import TYPE_PATTERN
 from operator import mul
 from functools import reduce
+from contextlib import nullcontext
 from .resolve import foreigns
-from .utils import classproperty, key_hash, user_choice
+from .utils import classproperty, key_hash, key_hashes, fetch_chunks, user_choice
 from .errors import MissingError
 from .logging import logger
+from . import cache
 
 
 def master_definition(name, comment, length):
@@ -53,6 +57,22 @@ class Set(dj.Lookup):
     def order(cls):
         return [f"{key} ASC" for key in cls.member_key]
 
+    @classmethod
+    def digest(cls, keys):
+        """
+        Parameters
+        ----------
+        keys : List[dict]
+            member keys, ordered by Set.order
+
+        Returns
+        -------
+        dict
+            set key -- content hash of the member keys
+        """
+        key = dict(enumerate(key_hashes(keys)))
+        return {f"{cls.name}_id": key_hash(key)}
+
     @property
     def members(self):
         """
@@ -61,24 +81,87 @@ class Set(dj.Lookup):
         Set.Member
             rows that make up the set
         """
-        key, n = self.fetch1(dj.key, "members")
+        key, n = cache.fetch1(self, dj.key, "members")
         members = self.Member & key
 
-        if len(members) == n:
+        if cache.count(members) == n:
             return members
         else:
             raise MissingError("Members are missing.")
 
     @classmethod
-    def fill(cls, restriction, note=None, *, prompt=True, silent=False):
+    def _fold(cls, chunks):
+        """Incremental equivalent of Set.digest
+
+        Parameters
+        ----------
+        chunks : Iterable[List[dict]]
+            chunks of member keys, ordered by Set.order
+
+        Returns
+        -------
+        int
+            number of member keys
+        dict
+            set key
+        """
+        n = 0
+        hashed = hashlib.md5()
+
+        for chunk in chunks:
+            for i, h in enumerate(key_hashes(chunk), n):
+                hashed.update(f"{i}{h}".encode())
+            n += len(chunk)
+
+        return n, {f"{cls.name}_id": hashed.hexdigest()}
+
+    @classmethod
+    def _verify_members(cls, key, chunk_size):
+        """Folds the digest over the inserted members, and deletes the set if it does not match the set key"""
+        index = f"{cls.name}_index"
+        member_key = cls.member_key
+
+        members = (cls.Member & key).proj(index)
+        chunks = fetch_chunks(members, chunk_size, [index])
+        _, digest = cls._fold([{k: row[k] for k in member_key} for row in chunk] for chunk in chunks)
+
+        if digest != key:
+            with cls.connection.transaction:
+                (cls.Member & key).delete_quick()
+                (cls & key).delete_quick()
+
+            raise MissingError(f"{key} members changed during fill and the set was deleted. Fill it again.")
+
+    @classmethod
+    def _insert_members(cls, key, chunks, silent=False):
+        index = f"{cls.name}_index"
+
+        for offset, chunk in chunks:
+            cls.Member.insert(
+                [{index: i, **k, **key} for i, k in enumerate(chunk, offset)],
+                skip_duplicates=True,
+            )
+
+            if not silent:
+                logger.info(f"{key} inserted members {offset} to {offset + len(chunk) - 1}.")
+
+    @classmethod
+    def fill(cls, restriction, note=None, *, prompt=True, silent=False, chunk_size=None):
         """Creates a hash for the restriction set, and inserts into master, member, and note tables
 
+        If the set already exists but its members are incomplete (e.g. after a crash), the missing members are inserted.
+
         Parameters
         ----------
         restriction : datajoint restriction
             used to restrict key_source
         note : str | None
             note to attach to the set
+        chunk_size : int | None
+            None -- keys are fetched and inserted at once | int -- keys are paged through and members are inserted
+            in batches of chunk_size, each committed on its own, bounding memory and transaction size -- keys are read
+            twice, so once the members are complete, the digest is folded over them again, and the set is deleted if
+            the keys changed in between
 
         Returns
         -------
@@ -86,16 +169,44 @@ class Set(dj.Lookup):
             set key
         """
         keys = cls.key_source.restrict(restriction)
-        keys = keys.fetch(as_dict=True, order_by=cls.order)
-        n = len(keys)
 
-        key = {i: key_hash(k) for i, k in enumerate(keys)}
-        key = {f"{cls.name}_id": key_hash(key)}
+        if chunk_size is None:
+            keys = keys.fetch(as_dict=True, order_by=cls.order)
+            n = len(keys)
+            key = cls.digest(keys)
+
+            def chunks(offset):
+                return [(offset, keys[offset:])] if offset < n else []
+
+        else:
+            index = f"{cls.name}_index"
+
+            def chunks(offset):
+                after = (cls.Member & key & {index: offset - 1}).fetch1() if offset else None
+                for chunk in fetch_chunks(keys, chunk_size, cls.member_key, after):
+                    yield offset, chunk
+                    offset += len(chunk)
+
+            n, key = cls._fold(chunk for _, chunk in chunks(0))
 
         if cls & key:
-            assert (cls & key).fetch1("members") == len(cls.Member & key)
+            members = (cls & key).fetch1("members")
+            inserted = len(cls.Member & key)
+            assert members == n and inserted <= members
 
-            if not silent:
+            if inserted < members:
+                if not silent:
+                    logger.info(f"{key} is missing members. Resuming from member {inserted}.")
+
+                cls._insert_members(key, chunks(inserted), silent=silent or chunk_size is None)
+
+                if chunk_size is not None:
+                    cls._verify_members(key, chunk_size)
+
+                if not silent:
+                    logger.info(f"{key} members completed.")
+
+            elif not silent:
                 logger.info(f"{key} already exists.")
 
         elif not prompt or user_choice(f"Insert set with {n} keys?") == "yes":
@@ -105,12 +216,105 @@ class Set(dj.Lookup):
                 skip_duplicates=True,
             )
 
-            index = f"{cls.name}_index"
-            cls.Member.insert(
-                [{index: i, **k, **key} for i, k in enumerate(keys)],
+            cls._insert_members(key, chunks(0), silent=silent or chunk_size is None)
+
+            if chunk_size is not None:
+                cls._verify_members(key, chunk_size)
+
+            if not silent:
+                logger.info(f"{key} inserted.")
+
+        else:
+            if not silent:
+                logger.info(f"{key} not inserted.")
+
+            return
+
+        if note:
+            if not silent:
+                logger.info(f"Note for {key} inserted.")
+
+            cls.Note.insert1(
+                dict(key, note=note),
                 skip_duplicates=True,
             )
 
+        return key
+
+    @classmethod
+    def _member_hashes(cls, members, order_by):
+        """key_hash of each member, computed by the database
+
+        Parameters
+        ----------
+        members : datajoint.QueryExpression
+            rows with the attributes of Set.member_key
+        order_by : List[str]
+            order of the hashes
+
+        Returns
+        -------
+        List[str] | None
+            hashes, or None if an attribute of Set.member_key is not an integer, string, or enum, whose text in SQL
+            may differ from its text in python
+        """
+        attrs = sorted(cls.member_key)
+        types = [members.heading[k].type for k in attrs]
+
+        if not all(any(TYPE_PATTERN[t].match(x) for t in ["INTEGER", "STRING", "ENUM"]) for x in types):
+            return
+
+        concat = ", ".join(f"'{k}', `{k}`" for k in attrs)
+        return list(members.proj(member_hash=f"MD5(CONCAT({concat}))").fetch("member_hash", order_by=order_by))
+
+    @classmethod
+    def _fill_members(cls, restriction, note=None, *, prompt=True, silent=False, chunk_size=None):
+        """Set.fill, with the members hashed and inserted by the database
+
+        Only the member hashes are fetched, and the members are inserted with a single INSERT ... SELECT, which
+        requires window functions (MySQL 8). Falls back to Set.fill if the members cannot be hashed by the database.
+        """
+        keys = cls.key_source.restrict(restriction)
+        hashes = cls._member_hashes(keys, cls.member_key)
+
+        if hashes is None:
+            return cls.fill(restriction, note, prompt=prompt, silent=silent, chunk_size=chunk_size)
+
+        n = len(hashes)
+        set_id = key_hash(dict(enumerate(hashes)))
+        key = {f"{cls.name}_id": set_id}
+
+        if cls & key and len(cls.Member & key) == n:
+            if not silent:
+                logger.info(f"{key} already exists.")
+
+        elif cls & key or not prompt or user_choice(f"Insert set with {n} keys?") == "yes":
+            index = f"{cls.name}_index"
+            table = cls.Member.full_table_name
+            attrs = ", ".join(f"`{k}`" for k in cls.member_key)
+            order = ", ".join(f"`{k}` ASC" for k in cls.member_key)
+
+            connection = cls.connection
+            transaction = nullcontext() if connection.in_transaction else connection.transaction
+
+            with transaction:
+                cls.insert1(
+                    dict(key, members=n),
+                    skip_duplicates=True,
+                )
+                connection.query(
+                    f"INSERT INTO {table} (`{cls.name}_id`, {attrs}, `{index}`) "
+                    f"SELECT '{set_id}', {attrs}, ROW_NUMBER() OVER (ORDER BY {order}) - 1 "
+                    f"FROM ({keys.make_sql()}) as `_members` "
+                    f"ON DUPLICATE KEY UPDATE {table}.`{index}` = {table}.`{index}`"
+                )
+                cache.invalidate(cls.Member)
+
+                # the members are read again by INSERT ... SELECT, and may have changed since they were hashed
+                members = (cls.Member & key).proj(index)
+                if cls._member_hashes(members, [index]) != hashes:
+                    raise MissingError(f"{key} members changed while the set was inserted. Fill it again.")
+
             if not silent:
                 logger.info(f"{key} inserted.")
 
@@ -132,8 +336,77 @@ class Set(dj.Lookup):
         return key
 
     @classmethod
-    def get(cls, restriction):
+    def union(cls, *sets, **kwargs):
+        """Creates the union of sets. Members are computed, hashed, and inserted by the database
+
+        Parameters
+        ----------
+        *sets : datajoint restriction
+            set keys
+        **kwargs
+            note, prompt, silent, chunk_size -- see Set.fill, chunk_size is only used if the members cannot be hashed
+            by the database
+
+        Returns
+        -------
+        dict | None
+            set key
         """
+        if not sets:
+            raise ValueError("At least one set must be provided.")
+
+        return cls._fill_members([(cls & key).members for key in sets], **kwargs)
+
+    @classmethod
+    def intersect(cls, *sets, **kwargs):
+        """Creates the intersection of sets. Members are computed, hashed, and inserted by the database
+
+        Parameters
+        ----------
+        *sets : datajoint restriction
+            set keys
+        **kwargs
+            note, prompt, silent, chunk_size -- see Set.fill, chunk_size is only used if the members cannot be hashed
+            by the database
+
+        Returns
+        -------
+        dict | None
+            set key
+        """
+        if not sets:
+            raise ValueError("At least one set must be provided.")
+
+        return cls._fill_members(dj.AndList([(cls & key).members for key in sets]), **kwargs)
+
+    @classmethod
+    def difference(cls, key, *others, **kwargs):
+        """Creates the difference of a set and other sets. Members are computed, hashed, and inserted by the database
+
+        Parameters
+        ----------
+        key : datajoint restriction
+            set key
+        *others : datajoint restriction
+            keys of sets whose members are removed
+        **kwargs
+            note, prompt, silent, chunk_size -- see Set.fill, chunk_size is only used if the members cannot be hashed
+            by the database
+
+        Returns
+        -------
+        dict | None
+            set key
+        """
+        restriction = [(cls & key).members]
+        restriction += [dj.Not((cls & other).members) for other in others]
+
+        return cls._fill_members(dj.AndList(restriction), **kwargs)
+
+    @classmethod
+    def get(cls, restriction):
+        """Looks up the set by the content hash of the restricted members
+
         Parameters
         ----------
         restriction : datajoint restriction
@@ -144,18 +417,13 @@ class Set(dj.Lookup):
         dict
             set key
         """
-        key = cls.key_source & restriction
-        n = len(key)
+        keys = cls.key_source.restrict(restriction)
+        keys = cache.fetch(keys, as_dict=True, order_by=cls.order)
 
-        if n:
-            candidates = cls & f"members = {n}"
-            members = cls.Member & key
-            key = candidates.aggr(members, n="count(*)") & f"n = {n}"
-        else:
-            key = cls & "members = 0"
+        key = cache.fetch(cls & cls.digest(keys), dj.key)
 
         if key:
-            return key.fetch1(dj.key)
+            return key[0]
         else:
             raise MissingError("Set does not exist.")
 
@@ -1,5 +1,11 @@
 import hashlib
+import numbers
+import struct
 import re
+import uuid
+import decimal
+import datetime
+from operator import itemgetter
 from datajoint import DataJointError
 
 
@@ -27,11 +33,187 @@ def key_hash(mapping):
     str
         hexdigest of hash
     """
-    hashed = hashlib.md5()
-    for k, v in sorted(mapping.items()):
-        hashed.update(str(k).encode())
-        hashed.update(str(v).encode())
-    return hashed.hexdigest()
+    return hashlib.md5("".join([str(k) + str(v) for k, v in sorted(mapping.items())]).encode()).hexdigest()
+
+
+def _encode_str(value):
+    data = value.encode()
+    return b"s" + len(data).to_bytes(4, "little") + data
+
+
+def _encode_int(value):
+    value = int(value)
+    data = value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+    return b"i" + len(data).to_bytes(4, "little") + data
+
+
+def _encode_float(value):
+    return b"f\x08\x00\x00\x00" + struct.pack("<d", value)
+
+
+def _encode_bytes(value):
+    return b"b" + len(value).to_bytes(4, "little") + value
+
+
+_encoders = {str: _encode_str, int: _encode_int, float: _encode_float, bytes: _encode_bytes}
+
+
+def _encode(value):
+    try:
+        return _encoders[type(value)](value)
+    except KeyError:
+        pass
+
+    if isinstance(value, str):
+        return _encode_str(value)
+    elif isinstance(value, bytes):
+        return _encode_bytes(value)
+    elif isinstance(value, numbers.Integral):
+        return _encode_int(value)
+    elif isinstance(value, numbers.Real):
+        return _encode_float(float(value))
+    else:
+        data = str(value).encode()
+        return b"o" + len(data).to_bytes(4, "little") + data
+
+
+def _encode_column(key, values):
+    types = set(map(type, values))
+
+    if len(types) == 1 and types <= {str, int, bytes}:
+        encoder = _encoders[types.pop()]
+        encoded = {v: key + encoder(v) for v in set(values)}
+        return [encoded[v] for v in values]
+    else:
+        return [key + _encode(v) for v in values]
+
+
+def _getter(keys):
+    if not keys:
+        return lambda mapping: ()
+    elif len(keys) == 1:
+        (key,) = keys
+        return lambda mapping: (mapping[key],)
+    else:
+        return itemgetter(*keys)
+
+
+def key_hashes(mappings, compatible=True):
+    """
+    32-byte hashes of many mappings' keys and values sorted by keys.
+
+    Parameters
+    ----------
+    mappings : Sequence[Mapping] | structured numpy array
+        mappings to hash
+    compatible : bool
+        True -- hexdigests are identical to key_hash | False -- hexdigests of a canonical, type-tagged binary encoding,
+        in which numpy scalars are encoded as the equivalent python int, float, str, or bytes
+
+    Returns
+    -------
+    list[str]
+        hexdigests of hashes
+    """
+    names = getattr(getattr(mappings, "dtype", None), "names", None)
+
+    if names is not None:
+        order = sorted(names)
+        columns = [mappings[k].tolist() for k in order]
+        groups = [(order, range(len(mappings)), zip(*columns))]
+
+    else:
+        groups = dict()
+        for i, mapping in enumerate(mappings):
+            groups.setdefault(tuple(mapping), []).append(i)
+
+        groups = [(sorted(keys), index) for keys, index in groups.items()]
+        groups = [(order, index, map(_getter(order), [mappings[i] for i in index])) for order, index in groups]
+
+    hashes = [None] * len(mappings)
+
+    for order, index, values in groups:
+        if compatible:
+            template = "".join([str(k).replace("{", "{{").replace("}", "}}") + "{!s}" for k in order]).format
+            for i, v in zip(index, values):
+                hashes[i] = hashlib.md5(template(*v).encode()).hexdigest()
+        elif not order:
+            for i in index:
+                hashes[i] = hashlib.md5(b"").hexdigest()
+        else:
+            columns = [_encode_column(_encode(k), column) for k, column in zip(order, zip(*values))]
+            for i, row in zip(index, zip(*columns)):
+                hashes[i] = hashlib.md5(b"".join(row)).hexdigest()
+
+    return hashes
+
+
+def _sql_value(attr, value):
+    if attr.uuid:
+        value = value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+        return f"X'{value.hex}'"
+    elif isinstance(value, (datetime.date, datetime.datetime, datetime.time, decimal.Decimal)):
+        return f'"{value}"'
+    else:
+        return repr(value)
+
+
+def _after(heading, order_by, row):
+    """SQL condition that selects the rows that come after row in the ascending order of attributes order_by"""
+    values = [f"`{k}`" for k in order_by], [_sql_value(heading[k], row[k]) for k in order_by]
+    conditions = []
+
+    for i in range(len(order_by)):
+        equal = [f"{a} = {v}" for a, v in zip(values[0][:i], values[1][:i])]
+        conditions.append(" AND ".join(equal + [f"{values[0][i]} > {values[1][i]}"]))
+
+    return " OR ".join(f"({c})" for c in conditions)
+
+
+def fetch_chunks(expr, chunk_size=None, order_by=None, after=None):
+    """Fetches the rows of a query expression in chunks, using keyset pagination
+
+    Each chunk is fetched with a condition on the last row of the previous chunk, instead of an offset, so that
+    fetching all chunks scans the rows once.
+
+    Parameters
+    ----------
+    expr : datajoint.QueryExpression
+        query expression
+    chunk_size : int | None
+        number of rows per chunk, None fetches all rows at once
+    order_by : Sequence[str] | None
+        attributes that uniquely identify the rows, in ascending order -- defaults to the primary key
+    after : dict | None
+        rows that come before or at this row in the order are skipped, optional
+
+    Yields
+    ------
+    list[dict]
+        rows of the chunk, non-empty
+    """
+    order_by = list(expr.primary_key if order_by is None else order_by)
+
+    if chunk_size is not None:
+        chunk_size = int(chunk_size)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer or None.")
+
+    while True:
+        rows = expr if after is None else expr & _after(expr.heading, order_by, after)
+
+        if chunk_size is None:
+            chunk = rows.fetch(as_dict=True, order_by=order_by)
+        else:
+            chunk = rows.fetch(as_dict=True, order_by=order_by, limit=chunk_size)
+
+        if chunk:
+            yield chunk
+
+        if chunk_size is None or len(chunk) < chunk_size:
+            break
+
+        after = chunk[-1]
 
 
 # ----- from https://github.com/datajoint/datajoint-python -----
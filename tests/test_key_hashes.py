@@ -0,0 +1,42 @@
+import numpy as np
+from djutils.utils import key_hash, key_hashes
+
+
+def rows(n=100):
+    rows = np.zeros(n, dtype=[("animal_id", "<i8"), ("session", "<i2"), ("scan_idx", "<i2"), ("name", "U16")])
+    rows["animal_id"] = np.arange(n)
+    rows["session"] = np.arange(n) % 7
+    rows["scan_idx"] = np.arange(n) % 3
+    rows["name"] = "scan"
+    return rows
+
+
+def keys(rows):
+    return [{k: v.item() for k, v in zip(rows.dtype.names, row)} for row in rows]
+
+
+def test_compatible():
+    array = rows()
+    dicts = keys(array)
+
+    assert key_hashes(dicts) == key_hashes(array) == [key_hash(k) for k in dicts]
+
+
+def test_canonical():
+    array = rows()
+    dicts = keys(array)
+    narrow = array.astype([("animal_id", "<i4"), ("session", "<i8"), ("scan_idx", "<u1"), ("name", "U4")])
+    numpy = [dict(zip(array.dtype.names, row)) for row in array]
+
+    expected = key_hashes(dicts, compatible=False)
+
+    assert key_hashes(array, compatible=False) == expected
+    assert key_hashes(narrow, compatible=False) == expected
+    assert key_hashes(numpy, compatible=False) == expected
+
+
+def test_mixed():
+    dicts = [{"a": 1}, {"a": 1.0}, {"a": "1"}, {"b": 1}, {}, {"a": 1, "b": None}]
+
+    assert key_hashes(dicts) == [key_hash(k) for k in dicts]
+    assert len(set(key_hashes(dicts, compatible=False))) == len(dicts)